@@ -14,10 +14,10 @@ GUI кондиционера (Tkinter + CAN)
 — Инвертор: «Main» из байта 7, «Sub» из байта 6; ошибки — биты байта 5.
 """
 from __future__ import annotations
-import threading, queue, time
+import threading, time, struct, collections, os, sys
 from dataclasses import dataclass
 import json
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Deque, Callable, NamedTuple
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 
@@ -42,18 +42,21 @@ class CANConfig:
     telemetry_ext: bool = True
     inverter_id: int = 0x5E0200
     inverter_ext: bool = True
+    rx_priority_boost: bool = False   # поток RX: выше приоритет / своё ядро
 
     @staticmethod
     def load_from_file(path: str) -> "CANConfig":
         if yaml is None:
             raise RuntimeError("pyyaml не установлен: pip install pyyaml")
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # libyaml, если собран
         with open(path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
+            data = yaml.load(f, Loader=loader) or {}
         cfg = CANConfig()
         bus = data.get("bus", {}) or {}
         cfg.iface = bus.get("interface", cfg.iface)
         cfg.channel = bus.get("channel", cfg.channel)
         cfg.bitrate = int(bus.get("bitrate", cfg.bitrate))
+        cfg.rx_priority_boost = bool(bus.get("rx_priority_boost", cfg.rx_priority_boost))
         cfg.messages = data.get("messages", {}) or {}
 
         telem = cfg.messages.get("TELEMETRY", {}) if cfg.messages else {}
@@ -71,38 +74,201 @@ class CANConfig:
         except Exception:
             cfg.inverter_id = 0x5E0200
         cfg.inverter_ext = bool(inv.get("extended", True))
+
+        # Шаблоны TX собираются один раз при загрузке
+        for msg_def in cfg.messages.values():
+            if not isinstance(msg_def, dict):
+                continue
+            tpl = msg_def.get("data_template")
+            if msg_def.get("data") is None and tpl:
+                compiled = tuple(_compile_item(it) for it in tpl)
+                msg_def["_compiled"] = compiled
+                msg_def["_packer"] = _compile_template(compiled)
         return cfg
 
 
+# ---- Предкомпиляция data_template в struct ----
+_WIDTH_FMT = {1: "B", 2: "H", 4: "I"}
+_T_CONST, _T_FIELD = 0, 1  # вид элемента в _compiled
+# (ширина, big-endian) → struct для одиночного поля (обычный путь _build_data)
+_FMT = {(w, big): struct.Struct((">" if big else "<") + f)
+        for w, f in _WIDTH_FMT.items() for big in (False, True)}
+_TX_BUF = bytearray(8)  # переиспользуемый буфер TX (отправка только из GUI-потока)
+
+
+def _compile_item(item: Any) -> tuple:
+    """Элемент data_template → (вид, поле|байт, масштаб, ширина, big-endian)."""
+    if isinstance(item, int):
+        return (_T_CONST, item & 0xFF, 1.0, 1, False)
+    if not isinstance(item, dict):
+        raise RuntimeError(f"Неверный элемент data_template: {item!r}")
+    field = item.get("field")
+    if field is None:
+        return (_T_CONST, int(item.get("value", 0)) & 0xFF, 1.0, 1, False)
+    width = int(item.get("bytes", 1))
+    if width not in _WIDTH_FMT:
+        width = 1
+    endian = str(item.get("endian", "le")).lower()
+    big = (endian != "le") if width == 2 else (width == 4 and endian == "be")
+    return (_T_FIELD, field, float(item.get("scale", 1.0)), width, big)
+
+
+def _compile_template(compiled: tuple):
+    """(struct.Struct, поля, литералы) из _compiled; None — если нужен обычный путь."""
+    fmt: List[str] = []
+    fields = []     # (имя, масштаб, маска)
+    literals = []   # (смещение, байт)
+    big: Optional[bool] = None
+    offset = 0
+    for kind, val, scale, width, is_big in compiled:
+        if kind == _T_CONST:
+            literals.append((offset, val))
+            fmt.append("x"); offset += 1; continue
+        if width > 1:
+            if big is None:
+                big = is_big
+            elif big != is_big:
+                return None  # смешанный порядок байт — один struct не подходит
+        fields.append((val, scale, (1 << (8 * width)) - 1))
+        fmt.append(_WIDTH_FMT[width]); offset += width
+    if offset > 8:
+        return None  # обрезка посреди поля — оставляем обычный путь
+    fmt.append("x" * (8 - offset))
+    return struct.Struct((">" if big else "<") + "".join(fmt)), tuple(fields), tuple(literals)
+
+
+# ---- Разбор телеметрии RX ----
+_TELEM = struct.Struct("<BBBBxxBB")    # err, set, temp, cond, (4,5), fan, state
+_INV8 = struct.Struct("<BBBxxBBB")     # cur, volt, temp, (3,4), err5, st6, st7
+_INV_MIN = struct.Struct("<BBB")       # cur, volt, temp
+
+
+# ---- Элементы rx_queue: (тег, данные) ----
+TAG_TELEM, TAG_INV, TAG_LOG, TAG_TX, TAG_ERR = 1, 2, 3, 4, 5
+
+
+# Кадры телеметрии фиксированной формы; log — готовая строка для журнала или None
+class TelemFrame(NamedTuple):
+    err: int
+    setp: int
+    temp: int
+    cond: int
+    fan_raw: int
+    state_raw: int
+    raw: List[int]
+    log: Optional[str]
+
+
+# Короткий кадр инвертора: отсутствующие байты — None
+class InvFrame(NamedTuple):
+    cur: int
+    volt: int
+    temp: int
+    err5: Optional[int]
+    state6: Optional[int]
+    state7: Optional[int]
+    raw: List[int]
+    log: Optional[str]
+
+
+# ---- Метка времени для логов: strftime не чаще раза в секунду ----
+_ts_cache = (0, "")
+
+
+def _ts() -> str:
+    global _ts_cache
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache = (now, time.strftime("%H:%M:%S", time.localtime(now)))  # атомарная замена кортежа
+    return _ts_cache[1]
+
+
+# ---- Hex-дамп кадров для журнала ----
+_RAW_LOG_MAX = 32  # не больше байт в hex-дампе журнала
+
+
+def _hex_dump(raw) -> str:
+    # "01 0A FF": bytes/bytearray — без копии, списки байт — через bytes()
+    if not isinstance(raw, (bytes, bytearray)):
+        raw = bytes(raw[:_RAW_LOG_MAX])
+    return raw[:_RAW_LOG_MAX].hex(" ").upper()
+
+
+# ---- Последний удачный COM (автодетект slcan) ----
+_LAST_CHANNEL_PATH = os.path.join(os.path.expanduser("~"), ".conditioner_last.json")
+
+
+def _load_last_channel() -> str:
+    try:
+        with open(_LAST_CHANNEL_PATH, "r", encoding="utf-8") as f:
+            return str(json.load(f).get("channel") or "")
+    except Exception:
+        return ""
+
+
+def _save_last_channel(channel: str):
+    if not channel:
+        return
+    try:
+        with open(_LAST_CHANNEL_PATH, "w", encoding="utf-8") as f:
+            json.dump({"channel": channel}, f)
+    except Exception:
+        pass
+
+
 # ======================== Клиент CAN ============================
 class CANClient:
-    def __init__(self, cfg: CANConfig, rx_queue: queue.Queue):
+    # Потоки: cfg не меняется после open() (RX читает его один раз на входе в _rx_loop);
+    # rx_queue — deque: append из RX и из GUI (open/send_from_key), popleft только из GUI;
+    # GUI → RX: _stop_evt, а также флаги _debug/_log_telem (пишет только GUI, RX лишь читает);
+    # _unmatched* принадлежат потоку RX.
+    def __init__(self, cfg: CANConfig, rx_queue: Deque[Any],
+                 notify: Optional[Callable[[], None]] = None):
         self.cfg = cfg
         self.rx_queue = rx_queue
+        self._notify = notify or (lambda: None)  # «в rx_queue есть данные» (из RX и GUI)
         self.bus: Optional[can.BusABC] = None
         self._stop_evt = threading.Event()
         self._reader: Optional[threading.Thread] = None
+        self._debug: bool = False  # покадровый DBG-лог RX
+        self._log_telem: bool = True  # строка TELEM/INV в '_log' кадра (пишет GUI, читает RX)
+        self._unmatched = 0        # кадры с чужими ID с последней сводки
+        self._unmatched_flush = 0.0
 
     def open(self):
         if can is None:
             raise RuntimeError("python-can не установлен: pip install python-can")
 
         channel = self.cfg.channel
-        if self.cfg.iface.lower() == "slcan" and (not channel or channel.strip() == ""):
-            try:
-                from serial.tools import list_ports  # type: ignore
-                ports = list(list_ports.comports())
-                preferred = [p.device for p in ports
-                             if ("canable" in (p.description or "").lower()
-                                 or "lawicel" in (p.description or "").lower())]
-                channel = preferred[0] if preferred else (ports[0].device if ports else "")
-            except Exception:
-                channel = ""
-            self.cfg.channel = channel or ""
-
-        self.bus = can.Bus(interface=self.cfg.iface,
-                           channel=self.cfg.channel,
-                           bitrate=self.cfg.bitrate)
+        auto = self.cfg.iface.lower() == "slcan" and (not channel or channel.strip() == "")
+        self.bus = None
+        if auto:
+            # Сначала COM из прошлого удачного подключения — без перебора портов
+            last = _load_last_channel()
+            if last:
+                try:
+                    self.bus = can.Bus(interface=self.cfg.iface, channel=last, bitrate=self.cfg.bitrate)
+                    self.cfg.channel = last
+                except Exception:
+                    self.bus = None
+            if self.bus is None:
+                try:
+                    from serial.tools import list_ports  # type: ignore
+                    ports = list(list_ports.comports())
+                    preferred = [p.device for p in ports
+                                 if ("canable" in (p.description or "").lower()
+                                     or "lawicel" in (p.description or "").lower())]
+                    channel = preferred[0] if preferred else (ports[0].device if ports else "")
+                except Exception:
+                    channel = ""
+                self.cfg.channel = channel or ""
+
+        if self.bus is None:
+            self.bus = can.Bus(interface=self.cfg.iface,
+                               channel=self.cfg.channel,
+                               bitrate=self.cfg.bitrate)
+        if auto:
+            _save_last_channel(self.cfg.channel)
         self._stop_evt.clear()
         self._reader = threading.Thread(target=self._rx_loop, daemon=True)
         self._reader.start()
@@ -110,7 +276,8 @@ class CANClient:
         self._dbg(f"expecting TELEMETRY id=0x{self.cfg.telemetry_id:X} ext={self.cfg.telemetry_ext} len>=8; "
                   f"INVERTER id=0x{self.cfg.inverter_id:X} ext={self.cfg.inverter_ext} len>=3/8; "
                   f"iface={self.cfg.iface} channel={self.cfg.channel or '(auto)'} bitrate={self.cfg.bitrate}")
-        self.rx_queue.put("DBG: GUI queue test — if you see this, queue->poll works")
+        self.rx_queue.append((TAG_LOG, "DBG: GUI queue test — if you see this, queue->poll works"))
+        self._notify()
 
     def close(self):
         self._stop_evt.set()
@@ -130,51 +297,81 @@ class CANClient:
         arb_id = int(msg_def.get("id"))
         is_ext = bool(msg_def.get("extended", False))
         data = self._build_data(msg_def, context or {})
-        msg = can.Message(arbitration_id=arb_id, is_extended_id=is_ext, data=bytes(data))
+        msg = can.Message(arbitration_id=arb_id, is_extended_id=is_ext, data=data)
         self.bus.send(msg)
-        self.rx_queue.put({'type': 'tx', 'id': arb_id, 'ext': is_ext, 'data': list(bytes(data))})
+        self.rx_queue.append((TAG_TX, {'id': arb_id, 'ext': is_ext, 'data': list(data)}))
+        self._notify()
+
+    def _build_data(self, msg_def: Dict[str, Any], ctx: Dict[str, Any]) -> bytes:
+        packer = msg_def.get("_packer")
+        if packer is not None:
+            st, fields, literals = packer
+            try:
+                nums = [int(round(float(ctx.get(f, 0)) * s)) & m for f, s, m in fields]
+            except Exception:
+                nums = []
+                for f, s, m in fields:
+                    try: nums.append(int(round(float(ctx.get(f, 0)) * s)) & m)
+                    except Exception: nums.append(0)
+            buf = _TX_BUF
+            st.pack_into(buf, 0, *nums)
+            for off, val in literals:
+                buf[off] = val
+            return bytes(buf)
 
-    def _build_data(self, msg_def: Dict[str, Any], ctx: Dict[str, Any]) -> List[int]:
         if "data" in msg_def and msg_def["data"] is not None:
             data = [int(x) & 0xFF for x in msg_def["data"]][:8]
         else:
-            tpl = msg_def.get("data_template", [])
+            tpl = msg_def.get("_compiled")
+            if tpl is None:
+                tpl = tuple(_compile_item(it) for it in msg_def.get("data_template", []))
             out: List[int] = []
-            for item in tpl:
-                if isinstance(item, int):
-                    out.append(item & 0xFF); continue
-                field = item.get("field")
-                if field is None:
-                    out.append(int(item.get("value", 0)) & 0xFF); continue
-                scale = float(item.get("scale", 1.0))
-                width = int(item.get("bytes", 1))
-                endian = str(item.get("endian", "le")).lower()
-                val = ctx.get(field, 0)
-                try: num = int(round(float(val) * scale))
-                except Exception: num = 0
-                if width == 1:
-                    out.append(num & 0xFF)
-                elif width == 2:
-                    b0, b1 = (num & 0xFF), ((num >> 8) & 0xFF)
-                    out.extend([b0, b1] if endian == 'le' else [b1, b0])
-                elif width == 4:
-                    bs = [(num >> (8*i)) & 0xFF for i in range(4)]
-                    if endian == 'be': bs.reverse()
-                    out.extend(bs)
+            for kind, val, scale, width, big in tpl:
+                if kind == _T_CONST:
+                    out.append(val)
                 else:
-                    out.append(num & 0xFF)
+                    try: num = int(round(float(ctx.get(val, 0)) * scale))
+                    except Exception: num = 0
+                    out.extend(_FMT[(width, big)].pack(num & ((1 << (8 * width)) - 1)))
                 if len(out) >= 8: break
             data = out[:8]
         while len(data) < 8:
             data.append(0)
-        return data[:8]
+        return bytes(data[:8])
+
+    def _boost_rx_thread(self):
+        # Вызывается из потока RX; всё необязательно — при отказе ОС только DBG в лог
+        sys.setswitchinterval(0.001)  # GIL отдаётся чаще: тик GUI между пачками RX
+        try:
+            if sys.platform == "win32":
+                import ctypes
+                k32 = ctypes.windll.kernel32
+                # THREAD_PRIORITY_ABOVE_NORMAL; отказ — BOOL 0 без исключения
+                if not k32.SetThreadPriority(k32.GetCurrentThread(), 1):
+                    raise OSError(f"SetThreadPriority: ошибка {k32.GetLastError()}")
+            elif hasattr(os, "sched_setaffinity"):
+                cpus = sorted(os.sched_getaffinity(0))
+                if len(cpus) > 1:
+                    os.sched_setaffinity(0, {cpus[-1]})  # 0 — текущий поток
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), -5)
+        except Exception as e:
+            self.rx_queue.append((TAG_LOG, f"DBG: rx_priority_boost применён не полностью: {e}"))
+            self._notify()
 
     def _rx_loop(self):
+        if self.cfg.rx_priority_boost:
+            self._boost_rx_thread()
         tid = self.cfg.telemetry_id
         text = self.cfg.telemetry_ext
         iid = self.cfg.inverter_id
         iext = self.cfg.inverter_ext
-        while not self._stop_evt.is_set():
+        # (id, ext) → (мин. длина, обработчик); при совпадении ID приоритет у контроллера
+        handlers = {(iid, iext): (3, self._handle_inv), (tid, text): (8, self._handle_telem)}
+        # Горячий цикл — только локальные ссылки
+        put = self.rx_queue.append
+        notify = self._notify
+        stop = self._stop_evt.is_set
+        while not stop():
             try:
                 msg = self.bus.recv(timeout=0.25)
                 if msg is None:
@@ -182,74 +379,120 @@ class CANClient:
                 got_id = msg.arbitration_id
                 got_ext = msg.is_extended_id
                 got_len = len(msg.data)
-                self._dbg(f"RX id=0x{got_id:X} ext={got_ext} len={got_len}")
-
-                # --- Контроллер кондиционера ---
-                if (got_id == tid) and (got_ext == text) and (got_len >= 8):
-                    d = bytes(msg.data)
-                    self.rx_queue.put({
-                        'type': 'telemetry',
-                        'err': d[0],
-                        'set': d[1],
-                        'temp': d[2],
-                        'cond': d[3],
-                        'fan_raw': d[6],
-                        'state_raw': d[7],
-                        'raw': list(d)
-                    })
-                    self.rx_queue.put(
-                        f"TELEM set={d[1]} temp={d[2]} cond={d[3]} fan_byte=0x{d[6]:02X} state_byte=0x{d[7]:02X} err={d[0]}"
-                    )
+                if self._debug:
+                    self._dbg(f"RX id=0x{got_id:X} ext={got_ext} len={got_len}")
+
+                # --- Известные ID: один поиск в таблице ---
+                h = handlers.get((got_id, got_ext))
+                if h is not None and got_len >= h[0]:
+                    h[1](msg.data, got_len)
+                    notify()
                     continue
 
-                # --- Инвертор ---
-                if (got_id == iid) and (got_ext == iext) and (got_len >= 3):
-                    d = bytes(msg.data)
-                    payload = {
-                        'type': 'inv',
-                        'cur': d[0], 'volt': d[1], 'temp': d[2],
-                        'raw': list(d[:max(3, got_len)])
-                    }
-                    if got_len >= 6:
-                        payload['err5'] = d[5]
-                    if got_len >= 7:
-                        payload['state6'] = d[6]
-                    if got_len >= 8:
-                        payload['state7'] = d[7]
-                    self.rx_queue.put(payload)
-                    self.rx_queue.put("INV cur=%d volt=%d temp=%d%s%s%s" % (
-                        d[0], d[1], d[2],
-                        (f" err5=0x{d[5]:02X}" if got_len >= 6 else ""),
-                        (f" st6={d[6]}" if got_len >= 7 else ""),
-                        (f" st7={d[7]}" if got_len >= 8 else ""),
-                    ))
-                    continue
-
-                # Прочее — лог
-                self.rx_queue.put(
-                    "DBG: not matched → "
-                    f"id=0x{got_id:X} ext={got_ext} len={got_len} | "
-                    f"telemetry exp: id=0x{tid:X} ext={text} len>=8 ; "
-                    f"inverter exp: id=0x{iid:X} ext={iext} len>=3"
-                )
-                self.rx_queue.put("CAN RX id=0x%X data=%s" % (
-                    got_id, ' '.join(f"{b:02X}" for b in msg.data)))
+                # Прочее — счётчик, сводка не чаще раза в секунду
+                self._unmatched += 1
+                if self._debug:
+                    put((TAG_LOG, "CAN RX id=0x%X data=%s" % (
+                        got_id, _hex_dump(msg.data))))
+                now = time.monotonic()
+                if now - self._unmatched_flush > 1.0:
+                    put((TAG_LOG,
+                         f"DBG: not matched ×{self._unmatched} → "
+                         f"last id=0x{got_id:X} ext={got_ext} len={got_len} | "
+                         f"telemetry exp: id=0x{tid:X} ext={text} len>=8 ; "
+                         f"inverter exp: id=0x{iid:X} ext={iext} len>=3"))
+                    self._unmatched = 0
+                    self._unmatched_flush = now
+                    notify()
 
             except Exception as e:
-                self.rx_queue.put(f"CANRXERR={e}")
+                put((TAG_ERR, f"CANRXERR={e}"))
+                notify()
                 time.sleep(0.2)
 
+    # --- Контроллер кондиционера ---
+    def _handle_telem(self, d, n: int):
+        # d — bytearray python-can: читаем без копии,
+        # в очередь уходит только list(d) для 'raw' (без алиасинга буфера)
+        err, setp, temp, cond, fan_raw, state_raw = _TELEM.unpack_from(d)
+        self.rx_queue.append((TAG_TELEM, TelemFrame(
+            err, setp, temp, cond, fan_raw, state_raw, list(d),
+            (f"TELEM set={setp} temp={temp} cond={cond} fan_byte=0x{fan_raw:02X} "
+             f"state_byte=0x{state_raw:02X} err={err}") if self._log_telem else None,
+        )))
+
+    # --- Инвертор ---
+    def _handle_inv(self, d, n: int):
+        if n >= 8:
+            cur, volt, temp, err5, st6, st7 = _INV8.unpack_from(d)
+        else:
+            cur, volt, temp = _INV_MIN.unpack_from(d)
+            err5 = d[5] if n >= 6 else None
+            st6 = d[6] if n >= 7 else None
+            st7 = None
+        log = None
+        if self._log_telem:
+            log = "INV cur=%d volt=%d temp=%d%s%s%s" % (
+                cur, volt, temp,
+                (f" err5=0x{err5:02X}" if err5 is not None else ""),
+                (f" st6={st6}" if st6 is not None else ""),
+                (f" st7={st7}" if st7 is not None else ""),
+            )
+        self.rx_queue.append((TAG_INV, InvFrame(cur, volt, temp, err5, st6, st7, list(d), log)))
+
+    # Метку времени и эхо в консоль добавляет GUI (_log → _flush_log)
     def _dbg(self, text: str):
-        ts = time.strftime("%H:%M:%S")
-        line = f"[{ts}] DBG: {text}"
-        print(line, flush=True)
         try:
-            self.rx_queue.put(line)
+            self.rx_queue.append((TAG_LOG, "DBG: " + text))
+            self._notify()
         except Exception:
             pass
 
 
 # =========================== GUI ==========================================
+_UNSET = object()
+
+
+def _state_names(names: Dict[int, str], size: int) -> tuple:
+    return tuple(names.get(i, f"неизв({i})") for i in range(size))
+
+
+class CachedIntVar(tk.IntVar):
+    """IntVar с Python-копией значения: .cached читается без обращения к Tcl.
+
+    Копию обновляет trace на запись — он срабатывает и на set(), и на ввод
+    из Entry/Spinbox/Scale. Пока в поле не число, .valid == False, а .cached
+    хранит последнее целое — отправлять его нельзя (на экране другое).
+    """
+    def __init__(self, master=None, value: int = 0, name: Optional[str] = None):
+        super().__init__(master, value, name)
+        self._cached = int(value)
+        self._valid = True
+        self.trace_add("write", self._on_write)
+
+    def _on_write(self, *_):
+        try:
+            self._cached = tk.IntVar.get(self)
+            self._valid = True
+        except (tk.TclError, ValueError):
+            self._valid = False
+
+    @property
+    def cached(self) -> int:
+        return self._cached
+
+    @property
+    def valid(self) -> bool:
+        return self._valid
+
+
+# Ошибки инвертора (байт 5): биты 0..4 → готовая строка для каждой маски
+_INV_ERR_BITS = ("Превышение макс. тока", "Не норма U1", "Не норма U2",
+                 "Превышение макс. температуры", "Флаг 18В")
+_INV_ERR_LUT = tuple(", ".join(b for i, b in enumerate(_INV_ERR_BITS) if m & (1 << i)) or "—"
+                     for m in range(32))
+
+
 class ACControllerApp(ttk.Frame):
     MAIN_STATE = {
         0: "выключено",
@@ -283,6 +526,11 @@ class ACControllerApp(ttk.Frame):
     }
 
     TIMEOUT_S = 10.0  # таймаут отсутствия телеметрии, сек
+    POLL_IDLE_MS = 500  # страховочный тик при доставке RX событием <<CANRx>>
+    POLL_NOEVENT_MS = 200  # тик без событий, если event_generate недоступен
+    POLL_BURST_MS = 10  # тик сразу после непустой выборки (поток кадров)
+    LOG_MAX_LINES = 5000  # предел строк в журнале
+    _FAN_CLAMP = (0, 1, 2, 3) + (3,) * 12  # ниббл скорости → уровень 0..3
 
     def __init__(self, master: tk.Tk):
         super().__init__(master, padding=10)
@@ -292,7 +540,7 @@ class ACControllerApp(ttk.Frame):
         self.master.rowconfigure(0, weight=1)
         self.master.columnconfigure(0, weight=1)
 
-        self._rx_q: queue.Queue = queue.Queue()
+        self._rx_q: Deque[Any] = collections.deque(maxlen=4096)  # RX и GUI пишут, читает только GUI
         self._client: Optional[CANClient] = None
         self._cfg: Optional[CANConfig] = None
 
@@ -301,6 +549,12 @@ class ACControllerApp(ttk.Frame):
         self.var_iface = tk.StringVar(value="slcan")
         self.var_channel = tk.StringVar(value="")
         self.var_bitrate = tk.IntVar(value=250000)
+        self.var_debug = tk.BooleanVar(value=False)  # покадровый DBG-лог RX
+        self.var_log_raw = tk.BooleanVar(value=False)  # hex-дампы кадров RX/TX в журнал
+        self.var_log_telem = tk.BooleanVar(value=True)  # строки TELEM/INV в журнал
+        self._log_rx_telem = False
+        self._log_rx_inv = False
+        self._log_tx = False
 
         # Телеметрия кондиционера
         self.var_temp = tk.StringVar(value="--")
@@ -310,27 +564,36 @@ class ACControllerApp(ttk.Frame):
         self.var_state_sub = tk.StringVar(value="—")
         self.var_err = tk.StringVar(value="нет")
         self._last_main_state: Optional[int] = None  # для логики SET
+        # Готовые строки состояний по коду: контроллер — ниббл (16), инвертор — байт (256)
+        self._main_names = _state_names(self.MAIN_STATE, 16)
+        self._sub_names = _state_names(self.SUB_STATE, 16)
+        self._inv_main_names = _state_names(self.INV_MAIN, 256)
+        self._inv_sub_names = _state_names(self.INV_SUB, 256)
+        self._main_txt = tuple("Main: " + t for t in self._main_names)
+        self._sub_txt = tuple("Sub:  " + t for t in self._sub_names)
+        self._inv_main_txt = tuple("Main: " + t for t in self._inv_main_names)
+        self._inv_sub_txt = tuple("Sub:  " + t for t in self._inv_sub_names)
+        self._current_setpoint: Optional[int] = None  # уставка из телеметрии (для START/STOP)
 
         # Уставка (для кнопки «Установить»)
-        self.var_set_input = tk.IntVar(value=25)
+        self.var_set_input = CachedIntVar(value=25)
 
         # Скорости (дефолт 30/60/90)
-        self.var_c1 = tk.IntVar(value=30)
-        self.var_c2 = tk.IntVar(value=60)
-        self.var_c3 = tk.IntVar(value=90)
-        self.var_e1 = tk.IntVar(value=30)
-        self.var_e2 = tk.IntVar(value=60)
-        self.var_e3 = tk.IntVar(value=90)
-        self._speed_conf = {
-            'c1': self.var_c1.get(), 'c2': self.var_c2.get(), 'c3': self.var_c3.get(),
-            'e1': self.var_e1.get(), 'e2': self.var_e2.get(), 'e3': self.var_e3.get(),
-        }
+        self.var_c1 = CachedIntVar(value=30)
+        self.var_c2 = CachedIntVar(value=60)
+        self.var_c3 = CachedIntVar(value=90)
+        self.var_e1 = CachedIntVar(value=30)
+        self.var_e2 = CachedIntVar(value=60)
+        self.var_e3 = CachedIntVar(value=90)
+        # Проценты по уровню 0..3 — «подтверждённые» отправкой скоростей
+        self._pct_c = [0, self.var_c1.cached, self.var_c2.cached, self.var_c3.cached]
+        self._pct_e = [0, self.var_e1.cached, self.var_e2.cached, self.var_e3.cached]
 
         # Пороги температур
-        self.var_t1 = tk.IntVar(value=36)
-        self.var_t2 = tk.IntVar(value=38)
-        self.var_t3 = tk.IntVar(value=2)
-        self.var_t4 = tk.IntVar(value=3)
+        self.var_t1 = CachedIntVar(value=36)
+        self.var_t2 = CachedIntVar(value=38)
+        self.var_t3 = CachedIntVar(value=2)
+        self.var_t4 = CachedIntVar(value=3)
 
         # Инвертор
         self.var_inv_cur = tk.StringVar(value="--")
@@ -345,18 +608,41 @@ class ACControllerApp(ttk.Frame):
         self.var_fan_level_e = tk.IntVar(value=0)   # 0..3
         self.var_fan_pct_c = tk.IntVar(value=0)     # %
         self.var_fan_pct_e = tk.IntVar(value=0)     # %
+        self._prev_lvl_c = self._prev_lvl_e = -1     # уровни последней перерисовки диаграмм
 
-        # Таймауты телеметрии
+        # Таймауты телеметрии (только GUI-поток, time.monotonic())
         self._last_ctrl_rx: float = 0.0
         self._last_inv_rx: float = 0.0
         self._ctrl_valid = False
         self._inv_valid = False
+        # (флаг «данные актуальны», время последнего кадра, сброс индикации, имя для лога)
+        self._timeout_specs = (
+            ("_ctrl_valid", "_last_ctrl_rx", self._reset_ctrl_display, "controller"),
+            ("_inv_valid", "_last_inv_rx", self._reset_inv_display, "inverter"),
+        )
         self._last_ctrl_state_snapshot: Optional[Dict[str, Any]] = None
         self._last_inv_state_snapshot: Optional[Dict[str, Any]] = None
+        self._last_var_vals: Dict[int, Any] = {}  # id(var) → последнее записанное значение
+        self._log_batch: List[str] = []  # строки журнала до конца тика _poll
+        self._log_flush_pending = False  # _flush_log уже запланирован (after_idle или конец _process_rx)
+        self._log_lines = 0  # строк в txt_log (без запроса index у виджета)
+        # Эхо журнала в консоль — только в терминал (pythonw: stdout is None)
+        self._echo_stdout = bool(sys.stdout is not None and sys.stdout.isatty())
+        self._changes_batch: List[str] = []  # то же для вкладки ChangesStates
+        self._rx_wake_pending = False  # <<CANRx>> уже в очереди Tk (ставит RX, снимает GUI)
+        self._rx_events_ok = True      # False — event_generate из потока недоступен
+        self._pending_telem: Optional[TelemFrame] = None  # последний кадр за тик
+        self._pending_inv: Optional[InvFrame] = None
+        self._rx_dispatch = (None, self._rx_telem, self._rx_inv, self._log, self._rx_tx, self._log)
 
         self.var_status = tk.StringVar(value="Отключено")
+        self._conn_status = "Отключено"  # статус подключения — возвращается после ошибки TX
 
         self._build_ui()
+        # Пути Tcl-команд журналов: _flush_log вызывает их напрямую, минуя обёртки Text
+        self._txt_log_path = str(self.txt_log)
+        self._txt_changes_path = str(self.txt_changes)
+        self.bind("<<CANRx>>", self._process_rx)
         self.after(120, self._poll)
 
     # ---------- UI ----------
@@ -377,6 +663,12 @@ class ACControllerApp(ttk.Frame):
         ttk.Entry(conn, textvariable=self.var_bitrate, width=9).grid(row=0, column=8, sticky="w")
         ttk.Button(conn, text="Подключиться", command=self.on_connect).grid(row=0, column=9, padx=6)
         ttk.Button(conn, text="Отключиться", command=self.on_disconnect).grid(row=0, column=10)
+        ttk.Checkbutton(conn, text="DBG RX", variable=self.var_debug,
+                        command=self._apply_debug).grid(row=0, column=11, padx=(6,0))
+        ttk.Checkbutton(conn, text="HEX", variable=self.var_log_raw,
+                        command=self._apply_log_raw).grid(row=0, column=12, padx=(6,0))
+        ttk.Checkbutton(conn, text="TELEM", variable=self.var_log_telem,
+                        command=self._apply_log_telem).grid(row=0, column=13, padx=(6,0))
 
         # ВКЛАДКИ СОСТОЯНИЙ
         nb_state = ttk.Notebook(self)
@@ -502,15 +794,27 @@ class ACControllerApp(ttk.Frame):
         ttk.Label(box, textvariable=lvl_var, font=("Segoe UI", 16, "bold")).grid(row=1, column=1, rowspan=2, sticky="e")
 
     def _draw_gauge(self, canvas: tk.Canvas, percent: int):
-        canvas.delete("all")
         p = max(0, min(100, int(percent)))
-        canvas.create_oval(6, 6, 54, 54, outline="#ddd", width=8)
+        ids = getattr(canvas, "_gauge_ids", None)
+        if ids is None:
+            # Элементы создаются один раз, дальше только itemconfigure
+            canvas.create_oval(6, 6, 54, 54, outline="#ddd", width=8)
+            full = canvas.create_oval(6, 6, 54, 54, outline="green", width=8, state="hidden")
+            arc = canvas.create_arc(6, 6, 54, 54, start=90, extent=0, style="arc", width=8,
+                                    outline="green", state="hidden")
+            txt = canvas.create_text(30, 30, text="", font=("Segoe UI", 9, "bold"))
+            ids = canvas._gauge_ids = (full, arc, txt)
+        full, arc, txt = ids
         if p >= 100:
-            canvas.create_oval(6, 6, 54, 54, outline="green", width=8)
+            canvas.itemconfigure(arc, state="hidden")
+            canvas.itemconfigure(full, state="normal")
         elif p > 0:
-            extent = p * 3.6
-            canvas.create_arc(6, 6, 54, 54, start=90, extent=-extent, style="arc", width=8, outline="green")
-        canvas.create_text(30, 30, text=f"{p}%", font=("Segoe UI", 9, "bold"))
+            canvas.itemconfigure(full, state="hidden")
+            canvas.itemconfigure(arc, extent=-p * 3.6, state="normal")
+        else:
+            canvas.itemconfigure(full, state="hidden")
+            canvas.itemconfigure(arc, state="hidden")
+        canvas.itemconfigure(txt, text=f"{p}%")
 
     def _stat_cell(self, parent, col, title, var, suffix):
         frm = ttk.Frame(parent, padding=6)
@@ -559,21 +863,23 @@ class ACControllerApp(ttk.Frame):
         box = ttk.LabelFrame(parent, text=title)
         box.grid(row=0, column=col, sticky="nsew", padx=6, pady=4)
         box.columnconfigure(1, weight=1)
+        vcmd = (self.register(self._clamp_0_100), "%P")
         for i, (label, var) in enumerate(items):
             ttk.Label(box, text=label).grid(row=i, column=0, sticky="e", padx=(4,6))
-            s = ttk.Scale(box, from_=0, to=100, orient="horizontal",
+            # Scale пишет в var сам; command лишь округляет до целого (без trace → нет обратной связи)
+            s = ttk.Scale(box, from_=0, to=100, orient="horizontal", variable=var,
                           command=lambda v, vv=var: vv.set(int(float(v))))
             s.grid(row=i, column=1, sticky="ew", padx=4)
-            s.set(var.get())
-            e = ttk.Entry(box, textvariable=var, width=5, justify="center")
+            e = ttk.Entry(box, textvariable=var, width=5, justify="center",
+                          validate="key", validatecommand=vcmd)
             e.grid(row=i, column=2, padx=4)
-            def on_entry_change(v=var, scale=s):
-                try: val = int(v.get())
-                except Exception: return
-                if val < 0: val = 0
-                if val > 100: val = 100
-                v.set(val); scale.set(val)
-            var.trace_add("write", lambda *a, f=on_entry_change: f())
+
+    @staticmethod
+    def _clamp_0_100(value: str) -> bool:
+        # Ввод в поле скорости: пусто (в процессе набора) или целое 0..100
+        if value == "":
+            return True
+        return value.isascii() and value.isdigit() and int(value) <= 100  # "²".isdigit() — True
 
     def _temp_field(self, parent, title: str, var: tk.IntVar, idx: int):
         ttk.Label(parent, text=title).grid(row=0, column=idx*2, sticky="e", padx=(6,4), pady=2)
@@ -588,15 +894,30 @@ class ACControllerApp(ttk.Frame):
             cfg.channel = self.var_channel.get().strip() or cfg.channel
             cfg.bitrate = int(self.var_bitrate.get() or cfg.bitrate)
             self._cfg = cfg
-            self._client = CANClient(cfg, self._rx_q)
+            self._client = CANClient(cfg, self._rx_q, notify=self._notify_rx)
+            self._apply_debug()
+            self._apply_log_telem()
             self._client.open()
-            self.var_status.set(f"CAN: {cfg.iface} {cfg.channel or '(auto)'} @ {cfg.bitrate}")
+            self._conn_status = f"CAN: {cfg.iface} {cfg.channel or '(auto)'} @ {cfg.bitrate}"
+            self._set_status(self._conn_status)
             self._log("CAN подключён")
         except Exception as e:
             messagebox.showerror("Ошибка CAN", str(e))
             self._client = None
             self._cfg = None
-            self.var_status.set("Отключено")
+            self._set_status("Отключено")
+
+    def _apply_debug(self):
+        if self._client:
+            self._client._debug = bool(self.var_debug.get())
+
+    def _apply_log_telem(self):
+        if self._client:
+            self._client._log_telem = bool(self.var_log_telem.get())
+
+    def _apply_log_raw(self):
+        on = bool(self.var_log_raw.get())
+        self._log_rx_telem = self._log_rx_inv = self._log_tx = on
 
     def on_disconnect(self):
         if not self._client:
@@ -605,392 +926,481 @@ class ACControllerApp(ttk.Frame):
             self._client.close()
         finally:
             self._client = None
-            self.var_status.set("Отключено")
+            self._set_status("Отключено")
             self._log("CAN отключён")
             self._last_ctrl_state_snapshot = None
             self._last_inv_state_snapshot = None
 
     # Получение уставки из блока «Состояние кондиционера»
     def _get_state_setpoint(self) -> Optional[int]:
-        s = (self.var_set.get() or "").strip()
-        try:
-            return int(s)
-        except Exception:
-            return None
+        return self._current_setpoint
 
     # Команды
     def on_start(self):
         val = self._get_state_setpoint()
         if val is None:
-            messagebox.showwarning("Уставка неизвестна",
-                                   "Уставка в блоке «Состояние кондиционера» ещё не получена от контроллера.")
+            self._tx_error("уставка в блоке «Состояние кондиционера» ещё не получена от контроллера")
             return
         self._send_can("START", {"value": val})
 
     def on_stop(self):
         val = self._get_state_setpoint()
         if val is None:
-            messagebox.showwarning("Уставка неизвестна",
-                                   "Уставка в блоке «Состояние кондиционера» ещё не получена от контроллера.")
+            self._tx_error("уставка в блоке «Состояние кондиционера» ещё не получена от контроллера")
             return
         self._send_can("STOP", {"value": val})
 
     def on_set(self):
         # «Установить» использует уставку из спинбокса (блок «Команды»)
-        val = int(self.var_set_input.get())
+        ctx = self._fields_ctx("SET", {"value": self.var_set_input})
+        if ctx is None:
+            return
         main = self._last_main_state
-        mode = 0x00 if (main == 2) else 0x20  # 0x00 при Main=ожидание, иначе 0x20
-        self._send_can("SET", {"value": val, "mode": mode})
+        ctx["mode"] = 0x00 if (main == 2) else 0x20  # 0x00 при Main=ожидание, иначе 0x20
+        self._send_can("SET", ctx)
 
     # Параметры
     def on_send_speeds(self):
-        ctx = {
-            "c1": int(self.var_c1.get()), "c2": int(self.var_c2.get()), "c3": int(self.var_c3.get()),
-            "e1": int(self.var_e1.get()), "e2": int(self.var_e2.get()), "e3": int(self.var_e3.get()),
-        }
-        self._send_can("PARAMS_SPEED", ctx)
-        self._speed_conf.update(ctx)
+        ctx = self._fields_ctx("PARAMS_SPEED", {
+            "c1": self.var_c1, "c2": self.var_c2, "c3": self.var_c3,
+            "e1": self.var_e1, "e2": self.var_e2, "e3": self.var_e3,
+        })
+        if ctx is None or not self._send_can("PARAMS_SPEED", ctx):
+            return
+        self._pct_c[1:] = [ctx['c1'], ctx['c2'], ctx['c3']]
+        self._pct_e[1:] = [ctx['e1'], ctx['e2'], ctx['e3']]
         self._update_gauges_with_current_levels()
 
     def _update_gauges_with_current_levels(self):
         lvl_c = int(self.var_fan_level_c.get())
         lvl_e = int(self.var_fan_level_e.get())
-        pct_map_c = {0: 0, 1: self._speed_conf['c1'], 2: self._speed_conf['c2'], 3: self._speed_conf['c3']}
-        pct_map_e = {0: 0, 1: self._speed_conf['e1'], 2: self._speed_conf['e2'], 3: self._speed_conf['e3']}
-        pct_c = pct_map_c.get(lvl_c, 0)
-        pct_e = pct_map_e.get(lvl_e, 0)
-        self.var_fan_pct_c.set(pct_c)
-        self.var_fan_pct_e.set(pct_e)
+        pct_c = self._pct_c[lvl_c] if 0 <= lvl_c < 4 else 0
+        pct_e = self._pct_e[lvl_e] if 0 <= lvl_e < 4 else 0
+        self._set(self.var_fan_pct_c, pct_c)
+        self._set(self.var_fan_pct_e, pct_e)
         if hasattr(self, "cnv_fan_c"): self._draw_gauge(self.cnv_fan_c, pct_c)
         if hasattr(self, "cnv_fan_e"): self._draw_gauge(self.cnv_fan_e, pct_e)
 
     def on_send_temps(self):
-        ctx = {"t1": int(self.var_t1.get()), "t2": int(self.var_t2.get()),
-               "t3": int(self.var_t3.get()), "t4": int(self.var_t4.get())}
-        self._send_can("PARAMS_TEMP", ctx)
+        ctx = self._fields_ctx("PARAMS_TEMP", {"t1": self.var_t1, "t2": self.var_t2,
+                                               "t3": self.var_t3, "t4": self.var_t4})
+        if ctx is not None:
+            self._send_can("PARAMS_TEMP", ctx)
+
+    # Значения полей для TX; нечисловое поле — ошибка TX, кадр не отправляется
+    def _fields_ctx(self, key: str, fields: Dict[str, CachedIntVar]) -> Optional[Dict[str, int]]:
+        bad = [name for name, var in fields.items() if not var.valid]
+        if bad:
+            self._tx_error(f"{key}: не число в поле {', '.join(bad)}")
+            return None
+        return {name: var.cached for name, var in fields.items()}
 
-    def _send_can(self, key: str, ctx: Dict[str, Any]):
-        if not self._client:
-            raise RuntimeError("CAN не подключен")
-        self._client.send_from_key(key, ctx)
+    # Ошибки TX — в строку состояния и журнал; диалоги только при подключении
+    def _send_can(self, key: str, ctx: Dict[str, Any]) -> bool:
+        try:
+            if not self._client:
+                raise RuntimeError("CAN не подключен")
+            self._client.send_from_key(key, ctx)
+            self._set_status(self._conn_status)  # снять прошлую «Ошибка TX»
+            return True
+        except Exception as e:
+            self._tx_error(f"{key}: {e}")
+            return False
+
+    def _tx_error(self, text: str):
+        self._set_status("Ошибка TX: " + text)
+        self._log("Ошибка TX: " + text)
+
+    def _set_status(self, text: str):
+        self._set(self.var_status, text)
+
+    # Запись в Tk-переменную только при изменении значения
+    def _set(self, var: tk.Variable, value: Any):
+        key = id(var)
+        if self._last_var_vals.get(key, _UNSET) != value:
+            self._last_var_vals[key] = value
+            var.set(value)
 
     # Сбросы при таймауте
     def _reset_ctrl_display(self):
-        self.var_temp.set("--")
-        self.var_cond.set("--")
-        self.var_set.set("--")
-        self.var_state_main.set("—")
-        self.var_state_sub.set("—")
-        self.var_err.set("нет")
-        self.var_fan_level_c.set(0)
-        self.var_fan_level_e.set(0)
+        self._set(self.var_temp, "--")
+        self._set(self.var_cond, "--")
+        self._set(self.var_set, "--")
+        self._current_setpoint = None
+        self._set(self.var_state_main, "—")
+        self._set(self.var_state_sub, "—")
+        self._set(self.var_err, "нет")
+        self._set(self.var_fan_level_c, 0)
+        self._set(self.var_fan_level_e, 0)
         self._update_gauges_with_current_levels()
+        self._prev_lvl_c = self._prev_lvl_e = -1
         self._last_ctrl_state_snapshot = None
 
     def _reset_inv_display(self):
-        self.var_inv_cur.set("--")
-        self.var_inv_volt.set("--")
-        self.var_inv_temp.set("--")
-        self.var_inv_main.set("—")
-        self.var_inv_sub.set("—")
-        self.var_inv_errs.set("—")
+        self._set(self.var_inv_cur, "--")
+        self._set(self.var_inv_volt, "--")
+        self._set(self.var_inv_temp, "--")
+        self._set(self.var_inv_main, "—")
+        self._set(self.var_inv_sub, "—")
+        self._set(self.var_inv_errs, "—")
         self._last_inv_state_snapshot = None
 
     # Форматирование ошибок инвертора из байта 5
     @staticmethod
     def _format_inv_errors(mask: int) -> str:
-        items = []
-        if mask & 0x01: items.append("Превышение макс. тока")
-        if mask & 0x02: items.append("Не норма U1")
-        if mask & 0x04: items.append("Не норма U2")
-        if mask & 0x08: items.append("Превышение макс. температуры")
-        if mask & 0x10: items.append("Флаг 18В")
-        return ", ".join(items) if items else "—"
-
-    # Приём/лог + обновление UI + таймауты
+        return _INV_ERR_LUT[mask & 0x1F]
+
+    # Каждый кадр контроллера: hex-дамп и журнал смены состояния (ChangesStates)
+    def _track_telem(self, item: TelemFrame):
+        err_val, set_val, temp_val, cond_val, fan_byte, state_byte, raw_list, _ = item
+        fan_clamp = self._FAN_CLAMP
+        lvl_c = fan_clamp[(fan_byte >> 4) & 0x0F]
+        lvl_e = fan_clamp[fan_byte & 0x0F]
+        main = (state_byte >> 4) & 0x0F
+        sub = state_byte & 0x0F
+        main_txt = self._main_names[main]
+        sub_txt = self._sub_names[sub]
+
+        if self._log_rx_telem and raw_list:
+            self._log("RX TELEM: " + _hex_dump(raw_list))
+
+        snapshot = {
+            'main': main,
+            'sub': sub,
+            'main_txt': main_txt,
+            'sub_txt': sub_txt,
+            'set': set_val,
+            'temp': temp_val,
+            'cond': cond_val,
+            'err': err_val,
+            'fan_level_c': lvl_c,
+            'fan_level_e': lvl_e,
+            'fan_pct_c': self._pct_c[lvl_c],
+            'fan_pct_e': self._pct_e[lvl_e],
+            'fan_raw': fan_byte,
+            'state_raw': state_byte,
+            'raw': raw_list,
+        }
+        prev_snapshot = self._last_ctrl_state_snapshot or {}
+        prev_main_code = prev_snapshot.get('main')
+        prev_sub_code = prev_snapshot.get('sub')
+        prev_main_txt = prev_snapshot.get('main_txt')
+        if prev_main_txt is None and prev_main_code is not None:
+            prev_main_txt = self._main_names[prev_main_code]
+        if prev_main_txt is None:
+            prev_main_txt = "—"
+        prev_sub_txt = prev_snapshot.get('sub_txt')
+        if prev_sub_txt is None and prev_sub_code is not None:
+            prev_sub_txt = self._sub_names[prev_sub_code]
+        if prev_sub_txt is None:
+            prev_sub_txt = "—"
+        if (prev_snapshot.get('main') != snapshot['main']) or (
+            prev_snapshot.get('sub') != snapshot['sub']
+        ):
+            previous_state = None
+            if prev_main_code is not None or prev_sub_code is not None:
+                previous_state = {
+                    'main_code': prev_main_code,
+                    'main_text': prev_main_txt,
+                    'sub_code': prev_sub_code,
+                    'sub_text': prev_sub_txt,
+                }
+            change_payload = {
+                'target': 'controller',
+                'new_state': {
+                    'main_code': snapshot['main'],
+                    'main_text': snapshot['main_txt'],
+                    'sub_code': snapshot['sub'],
+                    'sub_text': snapshot['sub_txt'],
+                },
+                'previous_state': previous_state,
+                'telemetry': {
+                    'setpoint': set_val,
+                    'temperature': temp_val,
+                    'condenser_temp': cond_val,
+                    'error': err_val,
+                    'fan': {
+                        'raw_byte': fan_byte,
+                        'levels': {
+                            'condenser': snapshot['fan_level_c'],
+                            'evaporator': snapshot['fan_level_e'],
+                        },
+                        'percent': {
+                            'condenser': snapshot['fan_pct_c'],
+                            'evaporator': snapshot['fan_pct_e'],
+                        },
+                    },
+                    'state_raw': snapshot['state_raw'],
+                    'raw_frame': snapshot['raw'],
+                    'raw_frame_hex': [f"{b:02X}" for b in snapshot['raw']],
+                },
+            }
+            self._log_changes(
+                "Controller state change → "
+                + json.dumps(change_payload, ensure_ascii=False)
+            )
+        self._last_ctrl_state_snapshot = snapshot
+
+    # Последний кадр контроллера за тик — в UI
+    def _on_telem(self, item: TelemFrame):
+        # горячий путь: поля кадра и частые атрибуты — в локальные переменные
+        err_val, set_val, temp_val, cond_val, fan_byte, state_byte, _, _ = item
+        vset = self._set
+        vset(self.var_err, str(err_val))
+        vset(self.var_set, str(set_val))
+        self._current_setpoint = set_val
+        vset(self.var_temp, str(temp_val))
+        vset(self.var_cond, str(cond_val))
+
+        fan_clamp = self._FAN_CLAMP
+        lvl_c = fan_clamp[(fan_byte >> 4) & 0x0F]
+        lvl_e = fan_clamp[fan_byte & 0x0F]
+        vset(self.var_fan_level_c, lvl_c)
+        vset(self.var_fan_level_e, lvl_e)
+
+        # проценты — только из «подтверждённых» значений; диаграммы — при смене уровня
+        if lvl_c != self._prev_lvl_c or lvl_e != self._prev_lvl_e:
+            self._prev_lvl_c, self._prev_lvl_e = lvl_c, lvl_e
+            self._update_gauges_with_current_levels()
+
+        main = (state_byte >> 4) & 0x0F
+        sub = state_byte & 0x0F
+        self._last_main_state = main
+        vset(self.var_state_main, self._main_txt[main])
+        vset(self.var_state_sub, self._sub_txt[sub])
+
+    # Каждый кадр инвертора: hex-дамп, накопление состояния и журнал его смены
+    def _track_inv(self, item: InvFrame):
+        cur_val, volt_val, temp_val, err_mask, s6, s7, inv_raw, _ = item
+        if self._log_rx_inv and inv_raw:
+            self._log("RX INV: " + _hex_dump(inv_raw))
+
+        prev_snapshot = self._last_inv_state_snapshot or {}
+        snapshot = {
+            'cur': cur_val,
+            'volt': volt_val,
+            'temp': temp_val,
+            'raw': inv_raw,
+            'main': prev_snapshot.get('main'),
+            'sub': prev_snapshot.get('sub'),
+            'main_txt': prev_snapshot.get('main_txt', "—"),
+            'sub_txt': prev_snapshot.get('sub_txt', "—"),
+            'err_mask_value': prev_snapshot.get('err_mask_value'),
+            'err_mask_hex': prev_snapshot.get('err_mask_hex', "—"),
+            'err_txt': prev_snapshot.get('err_txt', "—"),
+            'state6': prev_snapshot.get('state6'),
+            'state7': prev_snapshot.get('state7'),
+        }
+
+        main_changed = False
+        sub_changed = False
+
+        if s7 is not None:
+            snapshot['state7'] = s7
+            snapshot['main'] = s7
+            snapshot['main_txt'] = self._inv_main_names[s7]
+            main_changed = prev_snapshot.get('main') != s7
+        elif snapshot['main'] is not None:
+            snapshot['main_txt'] = self._inv_main_names[snapshot['main']]
+
+        if s6 is not None:
+            snapshot['state6'] = s6
+            snapshot['sub'] = s6
+            snapshot['sub_txt'] = self._inv_sub_names[s6]
+            sub_changed = prev_snapshot.get('sub') != s6
+        elif snapshot['sub'] is not None:
+            snapshot['sub_txt'] = self._inv_sub_names[snapshot['sub']]
+
+        # тот же байт ошибок, что в прошлом кадре: текст и hex уже перенесены в snapshot
+        if err_mask is not None and err_mask != snapshot['err_mask_value']:
+            err_txt = self._format_inv_errors(err_mask)
+            snapshot['err_mask_value'] = err_mask
+            snapshot['err_mask_hex'] = f"0x{err_mask:02X}"
+            snapshot['err_txt'] = err_txt
+
+        if main_changed or sub_changed:
+            prev_main_code = prev_snapshot.get('main')
+            prev_sub_code = prev_snapshot.get('sub')
+            prev_main_txt = prev_snapshot.get('main_txt')
+            if prev_main_txt is None and prev_main_code is not None:
+                prev_main_txt = self._inv_main_names[prev_main_code]
+            if prev_main_txt is None:
+                prev_main_txt = "—"
+            prev_sub_txt = prev_snapshot.get('sub_txt')
+            if prev_sub_txt is None and prev_sub_code is not None:
+                prev_sub_txt = self._inv_sub_names[prev_sub_code]
+            if prev_sub_txt is None:
+                prev_sub_txt = "—"
+            previous_state = None
+            if prev_main_code is not None or prev_sub_code is not None:
+                previous_state = {
+                    'main_code': prev_main_code,
+                    'main_text': prev_main_txt,
+                    'sub_code': prev_sub_code,
+                    'sub_text': prev_sub_txt,
+                }
+            change_payload = {
+                'target': 'inverter',
+                'new_state': {
+                    'main_code': snapshot['main'],
+                    'main_text': snapshot['main_txt'],
+                    'sub_code': snapshot['sub'],
+                    'sub_text': snapshot['sub_txt'],
+                },
+                'previous_state': previous_state,
+                'telemetry': {
+                    'current': cur_val,
+                    'voltage': volt_val,
+                    'temperature': temp_val,
+                    'error_mask': snapshot.get('err_mask_value'),
+                    'error_mask_hex': snapshot.get('err_mask_hex'),
+                    'error_text': snapshot.get('err_txt'),
+                    'state_bytes': {
+                        'state6': snapshot.get('state6'),
+                        'state7': snapshot.get('state7'),
+                    },
+                    'raw_frame': snapshot['raw'],
+                    'raw_frame_hex': [f"{b:02X}" for b in snapshot['raw']],
+                },
+            }
+            self._log_changes(
+                "Inverter state change → "
+                + json.dumps(change_payload, ensure_ascii=False)
+            )
+
+        self._last_inv_state_snapshot = snapshot
+
+    # Последний кадр инвертора за тик — в UI; байты 5..7 из коротких кадров — из snapshot
+    def _on_inv(self, item: InvFrame):
+        vset = self._set
+        vset(self.var_inv_cur, str(item.cur))
+        vset(self.var_inv_volt, str(item.volt))
+        vset(self.var_inv_temp, str(item.temp))
+        snapshot = self._last_inv_state_snapshot
+        if snapshot['main'] is not None:
+            vset(self.var_inv_main, self._inv_main_txt[snapshot['main']])
+        if snapshot['sub'] is not None:
+            vset(self.var_inv_sub, self._inv_sub_txt[snapshot['sub']])
+        if snapshot['err_mask_value'] is not None:
+            vset(self.var_inv_errs, snapshot['err_txt'])
+
+    # Страховочный тик: таймауты, а без событий <<CANRx>> — и приём
     def _poll(self):
-        now = time.time()
+        if self._process_rx():
+            delay = self.POLL_BURST_MS
+        else:
+            delay = self.POLL_IDLE_MS if self._rx_events_ok else self.POLL_NOEVENT_MS
+        self.after(delay, self._poll)
+
+    # Разбор элементов rx_queue по тегу (индекс — TAG_*)
+    # Журналы — по каждому кадру, в UI — только последний кадр тика
+    def _rx_telem(self, item: TelemFrame):
+        if item.log:
+            self._log(item.log)
+        self._track_telem(item)
+        self._pending_telem = item
+
+    def _rx_inv(self, item: InvFrame):
+        if item.log:
+            self._log(item.log)
+        self._track_inv(item)
+        self._pending_inv = item
+
+    def _rx_tx(self, item: Dict[str, Any]):
+        if self._log_tx:
+            self._log(f"TX id=0x{item['id']:X} data={_hex_dump(item['data'])}")
+        else:
+            self._log(f"TX id=0x{item['id']:X}")
+
+    # Вызывается из потока RX: будит GUI не более одного раза до следующей обработки
+    def _notify_rx(self):
+        if self._rx_wake_pending or not self._rx_events_ok:
+            return
+        self._rx_wake_pending = True
         try:
-            while True:
-                item = self._rx_q.get_nowait()
-                if isinstance(item, dict):
-                    t = item.get("type")
-                    if t == "telemetry":
-                        self._last_ctrl_rx = now
-                        self._ctrl_valid = True
-                        err_val = item.get("err", 0)
-                        set_val = item.get("set", "--")
-                        temp_val = item.get("temp", "--")
-                        cond_val = item.get("cond", "--")
-                        self.var_err.set(str(err_val))
-                        self.var_set.set(str(set_val))
-                        self.var_temp.set(str(temp_val))
-                        self.var_cond.set(str(cond_val))
-
-                        fan_byte = int(item.get("fan_raw", 0))
-                        lvl_c = max(0, min(3, (fan_byte >> 4) & 0x0F))
-                        lvl_e = max(0, min(3, fan_byte & 0x0F))
-                        self.var_fan_level_c.set(lvl_c)
-                        self.var_fan_level_e.set(lvl_e)
-
-                        # проценты — только из «подтверждённых» значений
-                        self._update_gauges_with_current_levels()
-
-                        state_byte = int(item.get("state_raw", 0))
-                        main = (state_byte >> 4) & 0x0F
-                        sub = state_byte & 0x0F
-                        self._last_main_state = main
-                        main_txt = self.MAIN_STATE.get(main, f"неизв({main})")
-                        sub_txt = self.SUB_STATE.get(sub, f"неизв({sub})")
-                        self.var_state_main.set(f"Main: {main_txt}")
-                        self.var_state_sub.set(f"Sub:  {sub_txt}")
-
-                        raw_val = item.get("raw")
-                        if isinstance(raw_val, (list, tuple)):
-                            raw_list = list(raw_val)
-                        elif isinstance(raw_val, (bytes, bytearray)):
-                            raw_list = list(raw_val)
-                        else:
-                            raw_list = []
-                        if raw_list:
-                            self._log("RX TELEM: " + " ".join(f"{b:02X}" for b in raw_list))
-
-                        snapshot = {
-                            'main': main,
-                            'sub': sub,
-                            'main_txt': main_txt,
-                            'sub_txt': sub_txt,
-                            'set': set_val,
-                            'temp': temp_val,
-                            'cond': cond_val,
-                            'err': err_val,
-                            'fan_level_c': lvl_c,
-                            'fan_level_e': lvl_e,
-                            'fan_pct_c': int(self.var_fan_pct_c.get()),
-                            'fan_pct_e': int(self.var_fan_pct_e.get()),
-                            'fan_raw': fan_byte,
-                            'state_raw': item.get("state_raw"),
-                            'raw': raw_list,
-                        }
-                        prev_snapshot = self._last_ctrl_state_snapshot or {}
-                        prev_main_code = prev_snapshot.get('main')
-                        prev_sub_code = prev_snapshot.get('sub')
-                        prev_main_txt = prev_snapshot.get('main_txt')
-                        if prev_main_txt is None and prev_main_code is not None:
-                            prev_main_txt = self.MAIN_STATE.get(prev_main_code, f"неизв({prev_main_code})")
-                        if prev_main_txt is None:
-                            prev_main_txt = "—"
-                        prev_sub_txt = prev_snapshot.get('sub_txt')
-                        if prev_sub_txt is None and prev_sub_code is not None:
-                            prev_sub_txt = self.SUB_STATE.get(prev_sub_code, f"неизв({prev_sub_code})")
-                        if prev_sub_txt is None:
-                            prev_sub_txt = "—"
-                        if (prev_snapshot.get('main') != snapshot['main']) or (
-                            prev_snapshot.get('sub') != snapshot['sub']
-                        ):
-                            previous_state = None
-                            if prev_main_code is not None or prev_sub_code is not None:
-                                previous_state = {
-                                    'main_code': prev_main_code,
-                                    'main_text': prev_main_txt,
-                                    'sub_code': prev_sub_code,
-                                    'sub_text': prev_sub_txt,
-                                }
-                            change_payload = {
-                                'target': 'controller',
-                                'new_state': {
-                                    'main_code': snapshot['main'],
-                                    'main_text': snapshot['main_txt'],
-                                    'sub_code': snapshot['sub'],
-                                    'sub_text': snapshot['sub_txt'],
-                                },
-                                'previous_state': previous_state,
-                                'telemetry': {
-                                    'setpoint': set_val,
-                                    'temperature': temp_val,
-                                    'condenser_temp': cond_val,
-                                    'error': err_val,
-                                    'fan': {
-                                        'raw_byte': fan_byte,
-                                        'levels': {
-                                            'condenser': snapshot['fan_level_c'],
-                                            'evaporator': snapshot['fan_level_e'],
-                                        },
-                                        'percent': {
-                                            'condenser': snapshot['fan_pct_c'],
-                                            'evaporator': snapshot['fan_pct_e'],
-                                        },
-                                    },
-                                    'state_raw': snapshot['state_raw'],
-                                    'raw_frame': snapshot['raw'],
-                                    'raw_frame_hex': [f"{b:02X}" for b in snapshot['raw']],
-                                },
-                            }
-                            self._log_changes(
-                                "Controller state change → "
-                                + json.dumps(change_payload, ensure_ascii=False)
-                            )
-                        self._last_ctrl_state_snapshot = snapshot
-
-                    elif t == "inv":
-                        self._last_inv_rx = now
-                        self._inv_valid = True
-
-                        cur_val = item.get("cur", "--")
-                        volt_val = item.get("volt", "--")
-                        temp_val = item.get("temp", "--")
-                        self.var_inv_cur.set(str(cur_val))
-                        self.var_inv_volt.set(str(volt_val))
-                        self.var_inv_temp.set(str(temp_val))
-
-                        raw_val = item.get("raw")
-                        if isinstance(raw_val, (list, tuple)):
-                            inv_raw = list(raw_val)
-                        elif isinstance(raw_val, (bytes, bytearray)):
-                            inv_raw = list(raw_val)
-                        else:
-                            inv_raw = []
-                        if inv_raw:
-                            self._log("RX INV: " + " ".join(f"{b:02X}" for b in inv_raw))
-
-                        prev_snapshot = self._last_inv_state_snapshot or {}
-                        snapshot = {
-                            'cur': cur_val,
-                            'volt': volt_val,
-                            'temp': temp_val,
-                            'raw': inv_raw,
-                            'main': prev_snapshot.get('main'),
-                            'sub': prev_snapshot.get('sub'),
-                            'main_txt': prev_snapshot.get('main_txt', "—"),
-                            'sub_txt': prev_snapshot.get('sub_txt', "—"),
-                            'err_mask_value': prev_snapshot.get('err_mask_value'),
-                            'err_mask_hex': prev_snapshot.get('err_mask_hex', "—"),
-                            'err_txt': prev_snapshot.get('err_txt', "—"),
-                            'state6': prev_snapshot.get('state6'),
-                            'state7': prev_snapshot.get('state7'),
-                        }
-
-                        main_changed = False
-                        sub_changed = False
-
-                        if 'state7' in item:
-                            s7 = int(item['state7'])
-                            snapshot['state7'] = s7
-                            snapshot['main'] = s7
-                            snapshot['main_txt'] = self.INV_MAIN.get(s7, f"неизв({s7})")
-                            self.var_inv_main.set(f"Main: {snapshot['main_txt']}")
-                            main_changed = prev_snapshot.get('main') != s7
-                        elif snapshot['main'] is not None:
-                            snapshot['main_txt'] = self.INV_MAIN.get(snapshot['main'], f"неизв({snapshot['main']})")
-
-                        if 'state6' in item:
-                            s6 = int(item['state6'])
-                            snapshot['state6'] = s6
-                            snapshot['sub'] = s6
-                            snapshot['sub_txt'] = self.INV_SUB.get(s6, f"неизв({s6})")
-                            self.var_inv_sub.set(f"Sub:  {snapshot['sub_txt']}")
-                            sub_changed = prev_snapshot.get('sub') != s6
-                        elif snapshot['sub'] is not None:
-                            snapshot['sub_txt'] = self.INV_SUB.get(snapshot['sub'], f"неизв({snapshot['sub']})")
-
-                        if 'err5' in item:
-                            err_mask = int(item['err5'])
-                            err_txt = self._format_inv_errors(err_mask)
-                            self.var_inv_errs.set(err_txt)
-                            snapshot['err_mask_value'] = err_mask
-                            snapshot['err_mask_hex'] = f"0x{err_mask:02X}"
-                            snapshot['err_txt'] = err_txt
-
-                        if main_changed or sub_changed:
-                            prev_main_code = prev_snapshot.get('main')
-                            prev_sub_code = prev_snapshot.get('sub')
-                            prev_main_txt = prev_snapshot.get('main_txt')
-                            if prev_main_txt is None and prev_main_code is not None:
-                                prev_main_txt = self.INV_MAIN.get(prev_main_code, f"неизв({prev_main_code})")
-                            if prev_main_txt is None:
-                                prev_main_txt = "—"
-                            prev_sub_txt = prev_snapshot.get('sub_txt')
-                            if prev_sub_txt is None and prev_sub_code is not None:
-                                prev_sub_txt = self.INV_SUB.get(prev_sub_code, f"неизв({prev_sub_code})")
-                            if prev_sub_txt is None:
-                                prev_sub_txt = "—"
-                            previous_state = None
-                            if prev_main_code is not None or prev_sub_code is not None:
-                                previous_state = {
-                                    'main_code': prev_main_code,
-                                    'main_text': prev_main_txt,
-                                    'sub_code': prev_sub_code,
-                                    'sub_text': prev_sub_txt,
-                                }
-                            change_payload = {
-                                'target': 'inverter',
-                                'new_state': {
-                                    'main_code': snapshot['main'],
-                                    'main_text': snapshot['main_txt'],
-                                    'sub_code': snapshot['sub'],
-                                    'sub_text': snapshot['sub_txt'],
-                                },
-                                'previous_state': previous_state,
-                                'telemetry': {
-                                    'current': cur_val,
-                                    'voltage': volt_val,
-                                    'temperature': temp_val,
-                                    'error_mask': snapshot.get('err_mask_value'),
-                                    'error_mask_hex': snapshot.get('err_mask_hex'),
-                                    'error_text': snapshot.get('err_txt'),
-                                    'state_bytes': {
-                                        'state6': snapshot.get('state6'),
-                                        'state7': snapshot.get('state7'),
-                                    },
-                                    'raw_frame': snapshot['raw'],
-                                    'raw_frame_hex': [f"{b:02X}" for b in snapshot['raw']],
-                                },
-                            }
-                            self._log_changes(
-                                "Inverter state change → "
-                                + json.dumps(change_payload, ensure_ascii=False)
-                            )
-
-                        self._last_inv_state_snapshot = snapshot
-
-                    elif t == "tx":
-                        data_hex = " ".join(f"{b:02X}" for b in item.get("data", []))
-                        self._log(f"TX id=0x{item['id']:X} data={data_hex}")
-                else:
-                    self._log(str(item))
-        except queue.Empty:
-            pass
+            self.event_generate("<<CANRx>>", when="tail")
+        except Exception:
+            self._rx_events_ok = False  # Tcl без поддержки потоков — остаётся опрос
+
+    # Приём/лог + обновление UI + таймауты; возвращает число разобранных элементов
+    def _process_rx(self, _event=None) -> int:
+        self._rx_wake_pending = False
+        self._log_flush_pending = True  # журналы выведет _flush_log в конце обработки
+        now = time.monotonic()  # таймауты — в монотонном времени
+        rx_q = self._rx_q
+        popleft = rx_q.popleft
+        dispatch = self._rx_dispatch
+        drained = 0
+        # Потребитель один (GUI), поэтому непустой deque не опустеет до popleft
+        while rx_q:
+            tag, payload = popleft()
+            dispatch[tag](payload)
+            drained += 1
+
+        # Из накопившихся кадров телеметрии в UI идёт только последний (журналы — уже по каждому)
+        telem, self._pending_telem = self._pending_telem, None
+        if telem is not None:
+            self._last_ctrl_rx = now
+            self._ctrl_valid = True
+            self._on_telem(telem)
+        inv, self._pending_inv = self._pending_inv, None
+        if inv is not None:
+            self._last_inv_rx = now
+            self._inv_valid = True
+            self._on_inv(inv)
 
         # Таймауты
-        if self._ctrl_valid and (now - self._last_ctrl_rx > self.TIMEOUT_S):
-            self._ctrl_valid = False
-            self._reset_ctrl_display()
-            self._log("DBG: timeout controller telemetry → reset display")
-
-        if self._inv_valid and (now - self._last_inv_rx > self.TIMEOUT_S):
-            self._inv_valid = False
-            self._reset_inv_display()
-            self._log("DBG: timeout inverter telemetry → reset display")
+        for valid, last_rx, reset, name in self._timeout_specs:
+            if getattr(self, valid) and now - getattr(self, last_rx) > self.TIMEOUT_S:
+                setattr(self, valid, False)
+                reset()
+                self._log(f"DBG: timeout {name} telemetry → reset display")
 
-        self.after(100, self._poll)
+        self._flush_log()
+        return drained
 
     def _log(self, text: str):
-        ts = time.strftime("%H:%M:%S")
-        line = f"[{ts}] {text}"
-        print(line, flush=True)
-        self.txt_log.insert(tk.END, line + "\n")
-        self.txt_log.see(tk.END)
+        self._log_batch.append(f"[{_ts()}] {text}")
+        # вне _process_rx (кнопки, подключение) — вывести сразу, не ждать тика
+        if not self._log_flush_pending:
+            self._log_flush_pending = True
+            self.after_idle(self._flush_log)
+
+    # Накопленные за тик строки журналов — одной вставкой в каждый Text
+    def _flush_log(self):
+        self._log_flush_pending = False
+        call = self.tk.call
+        echo = ""  # эхо в консоль — одной записью и одним flush за тик
+        if self._log_batch:
+            text = "\n".join(self._log_batch) + "\n"
+            self._log_batch.clear()
+            echo = text
+            path = self._txt_log_path
+            call(path, "insert", "end", text)
+            self._log_lines += text.count("\n")
+            extra = self._log_lines - self.LOG_MAX_LINES
+            if extra > 0:
+                call(path, "delete", "1.0", f"{extra + 1}.0")
+                self._log_lines -= extra
+            call(path, "see", "end")
+        if self._changes_batch:
+            text = "\n".join(self._changes_batch) + "\n"
+            self._changes_batch.clear()
+            echo += text
+            path = self._txt_changes_path
+            call(path, "configure", "-state", "normal")
+            call(path, "insert", "end", text)
+            call(path, "see", "end")
+            call(path, "configure", "-state", "disabled")
+        if echo and self._echo_stdout:
+            try:
+                sys.stdout.write(echo)
+                sys.stdout.flush()
+            except (OSError, ValueError):
+                self._echo_stdout = False  # консоль закрыта — дальше без эха
 
     def _log_changes(self, text: str):
-        if not hasattr(self, "txt_changes"):
-            return
-        ts = time.strftime("%H:%M:%S")
-        line = f"[{ts}] {text}"
-        print(line, flush=True)
-        self.txt_changes.config(state=tk.NORMAL)
-        self.txt_changes.insert(tk.END, line + "\n")
-        self.txt_changes.see(tk.END)
-        self.txt_changes.config(state=tk.DISABLED)
+        self._changes_batch.append(f"[{_ts()}] {text}")
 
 
 def main():